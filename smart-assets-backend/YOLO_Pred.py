@@ -1,21 +1,135 @@
+import os
 import cv2
 import numpy as np
 import yaml
 from yaml.loader import SafeLoader
 import logging
 
+from inference_backends import OnnxRuntimeNet, TensorRTNet
+from jit_postprocess import postprocess as jit_postprocess
+
+
+INPUT_WH_YOLO = 640
+
+
+def quantized_variants(onnx_model):
+    """
+    List the reduced-precision exports of a model, most preferred first.
+
+    Args:
+        onnx_model (str): Path to the FP32 ONNX model.
+
+    Returns:
+        list[str]: Paths such as models/best.int8.onnx and models/best.fp16.onnx.
+    """
+    root, ext = os.path.splitext(onnx_model)
+    return [f'{root}.int8{ext}', f'{root}.fp16{ext}']
+
+
+def tensorrt_engine(onnx_model):
+    """
+    Path of the TensorRT engine built from a model, e.g. models/best.engine.
+    """
+    return os.path.splitext(onnx_model)[0] + '.engine'
+
+
+def non_max_suppression(boxes, scores, score_thresh=0.25, iou_thresh=0.45, soft=False, sigma=0.5,
+                        max_candidates=3000, max_det=300):
+    """
+    Suppress overlapping boxes, returning the kept indices along with their
+    final scores.
+
+    Greedy NMS drops every box whose IoU with a higher-scoring kept box exceeds
+    `iou_thresh`; it runs in cv2.dnn.NMSBoxes, which is faster than any NumPy
+    loop. Gaussian soft-NMS instead decays the scores of overlapping
+    boxes by exp(-iou^2 / sigma) and keeps boxes while their decayed score
+    stays above `score_thresh`; since every pick rescans the candidates, it
+    only considers the `max_candidates` best boxes and stops after `max_det`.
+
+    Args:
+        boxes (np.ndarray): (N, 4) integer boxes as (x, y, w, h).
+        scores (np.ndarray): (N,) box scores.
+        score_thresh (float): Minimum score for a box to be kept.
+        iou_thresh (float): IoU above which greedy NMS suppresses a box.
+        soft (bool): Whether to use Gaussian soft-NMS instead of greedy NMS.
+        sigma (float): Gaussian decay parameter for soft-NMS.
+        max_candidates (int): Highest-scoring boxes considered by soft-NMS.
+        max_det (int): Maximum number of boxes kept by soft-NMS.
+
+    Returns:
+        tuple: (indices (K,) int64 of the kept boxes, highest score first,
+            scores (K,) of the kept boxes, decayed for soft-NMS).
+    """
+    if not soft:
+        keep = np.asarray(cv2.dnn.NMSBoxes(boxes, scores, score_thresh, iou_thresh), dtype=np.int64).reshape(-1)
+        return keep, scores[keep]
+
+    x1 = boxes[:, 0].astype(np.int64)
+    y1 = boxes[:, 1].astype(np.int64)
+    x2 = x1 + boxes[:, 2]
+    y2 = y1 + boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+
+    def iou(i, others):
+        inter = (np.maximum(0, np.minimum(x2[i], x2[others]) - np.maximum(x1[i], x1[others])) *
+                 np.maximum(0, np.minimum(y2[i], y2[others]) - np.maximum(y1[i], y1[others])))
+        union = areas[i] + areas[others] - inter
+        # Two empty boxes count as identical, as in OpenCV
+        return np.divide(inter, union, out=np.ones(len(others)), where=union > 0)
+
+    order = np.argsort(-scores, kind='stable')
+    order = order[scores[order] > score_thresh][:max_candidates]
+    order.sort()  # Back to index order, so ties go to the first box
+    decayed = scores[order].astype(np.float64)
+    keep = []
+    kept_scores = []
+    while order.size and len(keep) < max_det:
+        best = decayed.argmax()
+        i = order[best]
+        keep.append(i)
+        kept_scores.append(decayed[best])
+
+        # Decay the rest, then drop the pick and every box that fell below
+        # the threshold in a single pass
+        decayed *= np.exp(-iou(i, order) ** 2 / sigma)
+        alive = decayed > score_thresh
+        alive[best] = False
+        order = order[alive]
+        decayed = decayed[alive]
+
+    return np.array(keep, dtype=np.int64), np.array(kept_scores, dtype=scores.dtype)
+
+
+def cuda_available():
+    """
+    Check whether OpenCV was built with CUDA and can see a device.
+
+    Returns:
+        bool: True if at least one CUDA device is usable.
+    """
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except Exception:
+        return False
+
 
 class YOLO_Pred:
-    def __init__(self, onnx_model, data_yaml, conf_thresh=0.4, class_thresh=0.25, use_cuda=False):
+    def __init__(self, onnx_model, data_yaml, conf_thresh=0.4, class_thresh=0.25, use_cuda=None, fp16=True,
+                 soft_nms=False):
         """
         YOLOv5 Prediction Class.
 
         Args:
-            onnx_model (str): Path to the ONNX model.
+            onnx_model (str): Path to the ONNX model. Exports saved next to it by
+                quantize_model.py are used instead when they can be loaded: a
+                TensorRT engine (*.engine) on GPU, then *.int8.onnx, then *.fp16.onnx.
             data_yaml (str): Path to the YAML file with class names and configuration.
             conf_thresh (float): Confidence threshold for detections.
             class_thresh (float): Class score threshold for detections.
-            use_cuda (bool): Whether to use GPU acceleration.
+            use_cuda (bool): Whether to use GPU acceleration. Defaults to None,
+                which enables it when a CUDA device is available.
+            fp16 (bool): Whether to run in half precision on the GPU.
+            soft_nms (bool): Whether to use Gaussian soft-NMS instead of greedy NMS.
         """
         # Set up logging
         logging.basicConfig(level=logging.INFO, filename='yolo_pred.log', filemode='a',
@@ -29,25 +143,91 @@ class YOLO_Pred:
         self.nc = data_yaml['nc']
         self.conf_thresh = conf_thresh  # Confidence threshold
         self.class_thresh = class_thresh  # Class score threshold
+        self.soft_nms = soft_nms
+        self.batch_forward = True  # Cleared if the model rejects batched input
+
+        # Scratch buffers reused by every forward pass; _blob grows with the batch size
+        self._resized = np.empty((INPUT_WH_YOLO, INPUT_WH_YOLO, 3), dtype=np.uint8)
+        self._blob = np.empty((1, 3, INPUT_WH_YOLO, INPUT_WH_YOLO), dtype=np.float32)
+        self._pad_buf = None  # Letterbox canvas for a known frame size, see set_input_size
+        self._pad_shape = None
+
+        if use_cuda is None:
+            use_cuda = cuda_available()
+
+        # Prefer a TensorRT engine, then a quantized export of the model,
+        # falling back to FP32; on a GPU host the quantized exports are skipped
+        # unless onnxruntime can run them on CUDA
+        self.yolo = None
+        engine_path = tensorrt_engine(onnx_model)
+        if use_cuda and os.path.isfile(engine_path):
+            try:
+                self.yolo = TensorRTNet(engine_path)
+                self._warmup()
+                logging.info(f"Using TensorRT engine {engine_path}.")
+            except Exception as e:
+                self.yolo = None
+                logging.warning(f"Could not load TensorRT engine {engine_path}: {str(e)}")
 
-        # Load YOLO model
+        for quantized_model in quantized_variants(onnx_model):
+            if self.yolo is None and os.path.isfile(quantized_model):
+                try:
+                    self.yolo = OnnxRuntimeNet(quantized_model, use_cuda)
+                    self._warmup()
+                    logging.info(f"Using quantized model {quantized_model} ({', '.join(self.yolo.providers)}).")
+                    break
+                except Exception as e:
+                    self.yolo = None
+                    logging.warning(f"Could not load quantized model {quantized_model}: {str(e)}")
+
+        if self.yolo is None:
+            self._load_dnn(onnx_model, use_cuda, fp16)
+
+        # Generate consistent colors for classes
+        np.random.seed(10)
+        self.colors = np.random.randint(100, 255, size=(self.nc, 3)).astype(np.uint8)
+        # Per-class drawing inputs built once, so drawing a box allocates no color
+        # tuple and formats only the confidence
+        self._color_tuples = [tuple(int(v) for v in c) for c in self.colors]
+        self._label_prefix = [f'{name}: ' for name in self.labels]
+
+    def _load_dnn(self, onnx_model, use_cuda, fp16):
+        """
+        Load the FP32 model with cv2.dnn on the CUDA backend if requested,
+        otherwise (or if CUDA fails) on the OpenCV CPU backend.
+        """
         try:
             self.yolo = cv2.dnn.readNetFromONNX(onnx_model)
-            if use_cuda:
+        except Exception as e:
+            logging.error(f"Error loading YOLO model: {str(e)}")
+            raise RuntimeError(f"Failed to load YOLO model: {str(e)}")
+
+        if use_cuda:
+            try:
                 self.yolo.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
-                self.yolo.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA)
-                logging.info("Using GPU acceleration.")
-            else:
-                self.yolo.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-                self.yolo.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
-                logging.info("Using CPU for inference.")
+                self.yolo.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA_FP16 if fp16 else cv2.dnn.DNN_TARGET_CUDA)
+                self._warmup()
+                logging.info(f"Using GPU acceleration ({'FP16' if fp16 else 'FP32'}).")
+                return
+            except Exception as e:
+                logging.warning(f"CUDA initialization failed, falling back to CPU: {str(e)}")
+
+        try:
+            self.yolo.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self.yolo.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self._warmup()
+            logging.info("Using CPU for inference.")
         except Exception as e:
             logging.error(f"Error loading YOLO model: {str(e)}")
             raise RuntimeError(f"Failed to load YOLO model: {str(e)}")
 
-        # Generate consistent colors for classes
-        np.random.seed(10)
-        self.colors = np.random.randint(100, 255, size=(self.nc, 3)).tolist()
+    def _warmup(self):
+        """
+        Run one forward pass and decode on a dummy blob so backend
+        initialization and JIT compilation are not paid by the first real frame.
+        """
+        self.yolo.setInput(np.zeros((1, 3, INPUT_WH_YOLO, INPUT_WH_YOLO), dtype=np.float32))
+        self._decode(self.yolo.forward()[0], INPUT_WH_YOLO)
 
     def update_thresholds(self, conf_thresh=None, class_thresh=None):
         """
@@ -74,75 +254,266 @@ class YOLO_Pred:
         Returns:
             np.ndarray: Processed image with bounding boxes and labels.
         """
+        return self.draw(image, self.detect(image))
+
+    def predictions_batch(self, frames):
+        """
+        Run predictions on a batch of images with a single forward pass.
+
+        Args:
+            frames (list[np.ndarray]): Input images.
+
+        Returns:
+            list[np.ndarray]: Processed images, in the same order as `frames`.
+        """
+        return [self.draw(frame, dets) for frame, dets in zip(frames, self.detect_batch(frames))]
+
+    def detect(self, image):
+        """
+        Detect objects in a single image without drawing on it.
+
+        Args:
+            image (np.ndarray or cv2.cuda.GpuMat): Input image.
+
+        Returns:
+            list[dict]: Detections as {'bbox': (x, y, w, h), 'conf': float, 'class_id': int}.
+        """
+        return self.detect_batch([image])[0]
+
+    def detect_batch(self, frames):
+        """
+        Detect objects in a batch of images with a single forward pass.
+
+        Models exported with a static batch size of 1 cannot take an N-image
+        blob; in that case the frames are forwarded one by one instead.
+
+        Frames may be GpuMats (e.g. from GpuVideoCapture); they are then
+        preprocessed on the GPU and, on the TensorRT backend, never leave it.
+
+        Args:
+            frames (list[np.ndarray or cv2.cuda.GpuMat]): Input images.
+
+        Returns:
+            list[list[dict]]: Detections for each image, in the same order as `frames`.
+        """
+        if not frames:
+            return []
+
         try:
-            # Ensure valid input dimensions
-            row, col, d = image.shape
-            max_rc = max(row, col)
-            input_image = np.zeros((max_rc, max_rc, 3), dtype=np.uint8)
-            input_image[0:row, 0:col] = image
-
-            INPUT_WH_YOLO = 640
-            blob = cv2.dnn.blobFromImage(input_image, 1 / 255, (INPUT_WH_YOLO, INPUT_WH_YOLO), swapRB=True, crop=False)
-            self.yolo.setInput(blob)
-            preds = self.yolo.forward()
-
-            detections = preds[0]
-            boxes = []
-            confidences = []
-            classes = []
-
-            image_w, image_h = input_image.shape[:2]
-            x_factor = image_w / INPUT_WH_YOLO
-            y_factor = image_h / INPUT_WH_YOLO
-
-            for i in range(len(detections)):
-                row = detections[i]
-                confidence = row[4]
-                if confidence > self.conf_thresh:  # Use dynamic confidence threshold
-                    class_score = row[5:].max()
-                    class_id = row[5:].argmax()
-
-                    if class_score > self.class_thresh:  # Use dynamic class score threshold
-                        cx, cy, w, h = row[0:4]
-                        left = int((cx - 0.5 * w) * x_factor)
-                        top = int((cy - 0.5 * h) * y_factor)
-                        width = int(w * x_factor)
-                        height = int(h * y_factor)
-
-                        box = np.array([left, top, width, height])
-                        confidences.append(confidence)
-                        boxes.append(box)
-                        classes.append(class_id)
-
-            boxes_np = np.array(boxes).tolist()
-            confidences_np = np.array(confidences).tolist()
-
-            indices = cv2.dnn.NMSBoxes(boxes_np, confidences_np, 0.25, 0.45)
-            if len(indices) > 0:
-                index = indices.flatten()
+            if isinstance(frames[0], np.ndarray):
+                inputs = frames  # Letterboxed one at a time while filling the blob
+                sizes = [max(frame.shape[:2]) for frame in frames]
             else:
-                index = []
+                inputs = [self._preprocess_gpu(frame) for frame in frames]
+                sizes = [max(frame.size()) for frame in frames]
+            preds = self._forward_batch(inputs)
 
-            for ind in index:
-                x, y, w, h = boxes_np[ind]
-                bb_conf = int(confidences_np[ind] * 100)
-                classes_id = classes[ind]
-                class_name = self.labels[classes_id]
-                color = tuple(self.colors[classes_id])  # Use pre-generated colors
+            return [self._decode(det, size) for det, size in zip(preds, sizes)]
 
-                text = f'{class_name}: {bb_conf}%'
+        except Exception as e:
+            logging.error(f"Error processing batch: {str(e)}")
+            return [[] for _ in frames]
 
-                cv2.rectangle(image, (x, y), (x + w, y + h), color, 2)
-                cv2.rectangle(image, (x, y - 30), (x + w, y), color, -1)
+    def set_input_size(self, height, width):
+        """
+        Preallocate the letterbox canvas for frames of a fixed size, e.g. all
+        frames of one video, so padding a frame is a single copy into it.
 
-                cv2.putText(image, text, (x, y - 10), cv2.FONT_HERSHEY_PLAIN, 0.7, (0, 0, 0), 1)
+        Args:
+            height (int): Frame height.
+            width (int): Frame width.
+        """
+        max_rc = max(height, width)
+        # The padding strip is zeroed once here and never written afterwards
+        self._pad_buf = np.zeros((max_rc, max_rc, 3), dtype=np.uint8)
+        self._pad_shape = (height, width)
 
-            return image
+    @property
+    def gpu_input(self):
+        """
+        Whether the backend accepts preprocessed GpuMats without a host round trip.
+        """
+        return hasattr(self.yolo, 'setInputGpu')
 
-        except Exception as e:
-            logging.error(f"Error processing frame: {str(e)}")
+    def draw(self, image, dets):
+        """
+        Draw bounding boxes and labels on an image.
+
+        Args:
+            image (np.ndarray): Image to draw on, modified in place.
+            dets (list[dict]): Detections returned by `detect`.
+
+        Returns:
+            np.ndarray: The annotated image.
+        """
+        for det in dets:
+            x, y, w, h = det['bbox']
+            bb_conf = int(det['conf'] * 100)
+            classes_id = det['class_id']
+            color = self._color_tuples[classes_id]  # Use pre-generated colors
+
+            text = f'{self._label_prefix[classes_id]}{bb_conf}%'
+
+            cv2.rectangle(image, (x, y), (x + w, y + h), color, 2)
+            cv2.rectangle(image, (x, y - 30), (x + w, y), color, -1)
+
+            cv2.putText(image, text, (x, y - 10), cv2.FONT_HERSHEY_PLAIN, 0.7, (0, 0, 0), 1)
+
+        return image
+
+    def _forward_batch(self, inputs):
+        """
+        Forward a list of images (or GPU-preprocessed planes) and return one
+        prediction per image.
+        """
+        if self.batch_forward and len(inputs) > 1:
+            try:
+                self._set_input(inputs)
+                return self.yolo.forward()
+            except Exception as e:
+                self.batch_forward = False
+                logging.warning(f"Model does not support batched input, falling back to per-frame inference: {str(e)}")
+
+        preds = []
+        for input_image in inputs:
+            self._set_input([input_image])
+            preds.append(self.yolo.forward()[0])
+        return preds
+
+    def _set_input(self, inputs):
+        """
+        Set the network input from images or GPU-preprocessed planes.
+        """
+        if isinstance(inputs[0], np.ndarray):
+            self.yolo.setInput(self._make_blob(inputs))
+        elif self.gpu_input:
+            self.yolo.setInputGpu(inputs)
+        else:
+            # cv2.dnn and onnxruntime only take host memory
+            blob = self._blob_buffer(len(inputs))
+            for i, planes in enumerate(inputs):
+                for c, plane in enumerate(planes):
+                    blob[i, c] = plane.download()
+            self.yolo.setInput(blob)
+
+    def _blob_buffer(self, n):
+        """
+        Return a (n, 3, 640, 640) view of the reusable input blob, growing it if needed.
+        """
+        if self._blob.shape[0] < n:
+            self._blob = np.empty((n, 3, INPUT_WH_YOLO, INPUT_WH_YOLO), dtype=np.float32)
+        return self._blob[:n]
+
+    def _preprocess_gpu(self, gpu_frame):
+        """
+        Letterbox, resize, convert to RGB and scale a frame on the GPU.
+
+        Args:
+            gpu_frame (cv2.cuda.GpuMat): BGR frame in device memory.
+
+        Returns:
+            list[cv2.cuda.GpuMat]: The R, G and B float32 planes of the network input.
+        """
+        col, row = gpu_frame.size()
+        max_rc = max(row, col)
+        padded = cv2.cuda.copyMakeBorder(gpu_frame, 0, max_rc - row, 0, max_rc - col,
+                                         cv2.BORDER_CONSTANT, value=(0, 0, 0))
+        resized = cv2.cuda.resize(padded, (INPUT_WH_YOLO, INPUT_WH_YOLO))
+        rgb = cv2.cuda.cvtColor(resized, cv2.COLOR_BGR2RGB)
+        return cv2.cuda.split(rgb.convertTo(cv2.CV_32FC3, alpha=1 / 255))
+
+    def _make_blob(self, inputs):
+        """
+        Letterbox images and fill the reusable input blob from them.
+
+        Equivalent to cv2.dnn.blobFromImages on the letterboxed images with
+        scale 1 / 255, size (640, 640) and swapRB=True, but writes into
+        preallocated buffers instead of fresh arrays per call.
+
+        Returns:
+            np.ndarray: A (N, 3, 640, 640) float32 view of the shared buffer.
+        """
+        blob = self._blob_buffer(len(inputs))
+        for i, image in enumerate(inputs):
+            cv2.resize(self._letterbox(image), (INPUT_WH_YOLO, INPUT_WH_YOLO), dst=self._resized)
+            blob[i] = self._resized[:, :, ::-1].transpose(2, 0, 1)  # BGR HWC -> RGB CHW
+        np.multiply(blob, 1 / 255, out=blob)
+        return blob
+
+    def _letterbox(self, image):
+        """
+        Pad an image to a square canvas anchored at the top-left corner.
+
+        The returned canvas may be shared and is only valid until the next call.
+        """
+        row, col, d = image.shape
+        max_rc = max(row, col)
+        if row == col:
             return image
 
+        if self._pad_shape == (row, col):
+            # Fixed-size input: only the frame region changes between calls
+            self._pad_buf[:row, :col] = image
+            return self._pad_buf
+
+        pad_h = max_rc - row
+        pad_w = max_rc - col
+        # Only the padding strip is written, instead of zero-filling the whole canvas
+        return cv2.copyMakeBorder(image, 0, pad_h, 0, pad_w, cv2.BORDER_CONSTANT, value=(0, 0, 0))
+
+    def _decode(self, detections, input_size):
+        """
+        Decode raw detections and apply NMS.
+
+        Args:
+            detections (np.ndarray): Raw model output for this image.
+            input_size (int): Side length of the letterboxed input.
+
+        Returns:
+            list[dict]: Kept detections, see `detect`.
+        """
+        # The letterboxed input is square, so one float32 factor scales both axes
+        scale = np.float32(input_size / INPUT_WH_YOLO)
+
+        if jit_postprocess is not None and not self.soft_nms:
+            boxes, confidences, classes = jit_postprocess(
+                detections, np.float32(self.conf_thresh), np.float32(self.class_thresh),
+                scale, 0.25, 0.45)
+            return [{'bbox': tuple(box), 'conf': conf, 'class_id': class_id}
+                    for box, conf, class_id in zip(boxes.tolist(), confidences.tolist(), classes.tolist())]
+
+        # Keep rows above the confidence threshold (use dynamic thresholds)
+        conf = detections[:, 4]
+        mask = conf > self.conf_thresh
+        d = detections[mask]
+
+        # Keep rows whose best class score passes the class threshold; the score
+        # is gathered from the argmax so the class slab is swept only once
+        cls_scores = d[:, 5:]
+        class_ids = cls_scores.argmax(axis=1)
+        class_best = np.take_along_axis(cls_scores, class_ids[:, None], axis=1).ravel()
+        mask2 = class_best > self.class_thresh
+        d = d[mask2]
+
+        cx, cy, w, h = d[:, 0], d[:, 1], d[:, 2], d[:, 3]
+        left = ((cx - 0.5 * w) * scale).astype(np.int32)
+        top = ((cy - 0.5 * h) * scale).astype(np.int32)
+        width = (w * scale).astype(np.int32)
+        height = (h * scale).astype(np.int32)
+
+        boxes = np.stack([left, top, width, height], axis=1)
+        confidences = conf[mask][mask2]
+        classes = class_ids[mask2]
+
+        # Soft-NMS reports the decayed scores of the boxes it keeps
+        index, kept_confidences = non_max_suppression(boxes, confidences, 0.25, 0.45, soft=self.soft_nms)
+
+        # Convert the kept rows to Python lists in one call each rather than
+        # indexing the arrays per detection
+        return [{'bbox': tuple(box), 'conf': conf, 'class_id': class_id}
+                for box, conf, class_id in zip(boxes[index].tolist(), kept_confidences.tolist(),
+                                               classes[index].tolist())]
+
     def generate_colors(self, ID):
         """
         Generate consistent colors for classes.
@@ -153,4 +524,4 @@ class YOLO_Pred:
         Returns:
             tuple: RGB color for the class.
         """
-        return tuple(self.colors[ID])
+        return self._color_tuples[ID]
@@ -0,0 +1,130 @@
+import numpy as np
+
+
+class OnnxRuntimeNet:
+    def __init__(self, onnx_model, use_cuda=False):
+        """
+        Runs an ONNX model with onnxruntime behind the same setInput/forward
+        interface as a cv2.dnn network.
+
+        Used for quantized exports, which cv2.dnn cannot load reliably.
+
+        Args:
+            onnx_model (str): Path to the ONNX model.
+            use_cuda (bool): Whether to run on the CUDA execution provider.
+
+        Raises:
+            ImportError: If onnxruntime is not installed.
+            RuntimeError: If use_cuda is set but onnxruntime cannot run on CUDA,
+                so the caller can fall back to cv2.dnn on the GPU instead.
+        """
+        import onnxruntime as ort
+
+        providers = ['CPUExecutionProvider']
+        if use_cuda:
+            if 'CUDAExecutionProvider' not in ort.get_available_providers():
+                raise RuntimeError("onnxruntime was built without CUDAExecutionProvider")
+            providers.insert(0, 'CUDAExecutionProvider')
+
+        self.session = ort.InferenceSession(onnx_model, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+        self.providers = self.session.get_providers()
+        if use_cuda and 'CUDAExecutionProvider' not in self.providers:
+            # onnxruntime silently drops a provider that fails to initialize
+            raise RuntimeError("CUDAExecutionProvider failed to initialize")
+        self._input = None
+
+    def setInput(self, blob):
+        self._input = np.ascontiguousarray(blob, dtype=np.float32)
+
+    def forward(self):
+        return self.session.run(None, {self.input_name: self._input})[0]
+
+
+class TensorRTNet:
+    def __init__(self, engine_path):
+        """
+        Runs a serialized TensorRT engine behind the same setInput/forward
+        interface as a cv2.dnn network.
+
+        Input and output live in pinned host buffers mirrored by device buffers
+        allocated once; each forward is an async copy-in, execute, copy-out on a
+        private CUDA stream.
+
+        Args:
+            engine_path (str): Path to an engine built from the ONNX model, e.g.
+                trtexec --onnx=best.onnx --saveEngine=best.engine --fp16
+
+        Raises:
+            ImportError: If tensorrt or pycuda is not installed.
+        """
+        import tensorrt as trt
+        import pycuda.autoprimaryctx  # noqa: F401 (shares OpenCV's primary CUDA context)
+        import pycuda.driver as cuda
+
+        self._cuda = cuda
+        logger = trt.Logger(trt.Logger.WARNING)
+        with open(engine_path, 'rb') as f, trt.Runtime(logger) as runtime:
+            self.engine = runtime.deserialize_cuda_engine(f.read())
+        if self.engine is None:
+            raise RuntimeError(f"Failed to deserialize TensorRT engine {engine_path}")
+
+        self.context = self.engine.create_execution_context()
+        self.stream = cuda.Stream()
+
+        # The exported YOLO model has a single input and a single output
+        names = [self.engine.get_tensor_name(i) for i in range(self.engine.num_io_tensors)]
+        self.input_name = next(n for n in names if self.engine.get_tensor_mode(n) == trt.TensorIOMode.INPUT)
+        self.output_name = next(n for n in names if self.engine.get_tensor_mode(n) == trt.TensorIOMode.OUTPUT)
+
+        self.h_input = cuda.pagelocked_empty(tuple(self.engine.get_tensor_shape(self.input_name)),
+                                             trt.nptype(self.engine.get_tensor_dtype(self.input_name)))
+        self.h_output = cuda.pagelocked_empty(tuple(self.engine.get_tensor_shape(self.output_name)),
+                                              trt.nptype(self.engine.get_tensor_dtype(self.output_name)))
+        self.d_input = cuda.mem_alloc(self.h_input.nbytes)
+        self.d_output = cuda.mem_alloc(self.h_output.nbytes)
+        self.context.set_tensor_address(self.input_name, int(self.d_input))
+        self.context.set_tensor_address(self.output_name, int(self.d_output))
+        self._input_on_device = False
+
+    def setInput(self, blob):
+        if blob.shape != self.h_input.shape:
+            raise ValueError(f"Engine expects input of shape {self.h_input.shape}, got {blob.shape}")
+        np.copyto(self.h_input, blob)
+        self._input_on_device = False
+
+    def setInputGpu(self, images):
+        """
+        Copy preprocessed planes straight from GpuMats into the engine input,
+        skipping the host round trip.
+
+        Args:
+            images (list[list[cv2.cuda.GpuMat]]): For each image, its R, G and B
+                float32 planes.
+        """
+        n, channels, height, width = self.h_input.shape
+        if len(images) != n or self.h_input.dtype != np.float32:
+            raise ValueError(f"Engine expects {n} float32 images, got {len(images)}")
+
+        row_bytes = width * self.h_input.itemsize
+        for i, planes in enumerate(images):
+            for c, plane in enumerate(planes):
+                # GpuMat rows may be padded, so copy with explicit pitches
+                copy = self._cuda.Memcpy2D()
+                copy.set_src_device(plane.cudaPtr())
+                copy.src_pitch = plane.step
+                copy.set_dst_device(int(self.d_input) + (i * channels + c) * height * row_bytes)
+                copy.dst_pitch = row_bytes
+                copy.width_in_bytes = row_bytes
+                copy.height = height
+                copy(self.stream)
+        self._input_on_device = True
+
+    def forward(self):
+        if not self._input_on_device:
+            self._cuda.memcpy_htod_async(self.d_input, self.h_input, self.stream)
+        self.context.execute_async_v3(self.stream.handle)
+        self._cuda.memcpy_dtoh_async(self.h_output, self.d_output, self.stream)
+        self.stream.synchronize()
+        # Copy out of the pinned buffer, which the next forward overwrites
+        return self.h_output.copy()
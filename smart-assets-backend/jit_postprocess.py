@@ -0,0 +1,99 @@
+"""
+Numba-compiled decode + greedy NMS for YOLO_Pred.
+
+`postprocess` is None when Numba is not installed; YOLO_Pred then uses its
+NumPy implementation, which produces the same detections.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _postprocess(dets, conf_thresh, class_thresh, scale, score_thresh, iou_thresh):
+    """
+    Decode raw detections and apply greedy NMS in a single compiled pass.
+
+    Thresholds and `scale` are float32 so every comparison and box coordinate
+    is computed exactly as in the NumPy path.
+
+    Args:
+        dets (np.ndarray): (N, 5 + nc) float32 raw model output.
+        conf_thresh (np.float32): Objectness threshold.
+        class_thresh (np.float32): Best class score threshold.
+        scale (np.float32): Letterboxed input size divided by the network input size.
+        score_thresh (float): Minimum score kept by NMS.
+        iou_thresh (float): IoU above which NMS suppresses a box.
+
+    Returns:
+        tuple: (boxes (K, 4) int32 as x, y, w, h, scores (K,) float32, class_ids (K,) int64).
+    """
+    n, cols = dets.shape
+    half = np.float32(0.5)
+
+    boxes = np.empty((n, 4), dtype=np.int32)
+    scores = np.empty(n, dtype=np.float32)
+    class_ids = np.empty(n, dtype=np.int64)
+    count = 0
+
+    for i in range(n):
+        conf = dets[i, 4]
+        if not conf > conf_thresh:
+            continue
+
+        # Best class with a single sweep; strict > keeps the first maximum like argmax
+        best = 5
+        for j in range(6, cols):
+            if dets[i, j] > dets[i, best]:
+                best = j
+        if not dets[i, best] > class_thresh:
+            continue
+
+        cx, cy, w, h = dets[i, 0], dets[i, 1], dets[i, 2], dets[i, 3]
+        boxes[count, 0] = np.int32((cx - half * w) * scale)
+        boxes[count, 1] = np.int32((cy - half * h) * scale)
+        boxes[count, 2] = np.int32(w * scale)
+        boxes[count, 3] = np.int32(h * scale)
+        scores[count] = conf
+        class_ids[count] = best - 5
+        count += 1
+
+    # Greedy NMS over candidates sorted by score; mergesort is stable, so ties
+    # keep their original order as in cv2.dnn.NMSBoxes
+    order = np.argsort(-scores[:count], kind='mergesort')
+    suppressed = np.zeros(count, dtype=np.bool_)
+    keep = np.empty(count, dtype=np.int64)
+    kept = 0
+
+    for a in range(count):
+        i = order[a]
+        if suppressed[i] or not scores[i] > score_thresh:
+            continue
+        keep[kept] = i
+        kept += 1
+
+        ix1, iy1 = np.int64(boxes[i, 0]), np.int64(boxes[i, 1])
+        ix2, iy2 = ix1 + boxes[i, 2], iy1 + boxes[i, 3]
+        area_i = (ix2 - ix1) * (iy2 - iy1)
+
+        for b in range(a + 1, count):
+            k = order[b]
+            if suppressed[k]:
+                continue
+            kx1, ky1 = np.int64(boxes[k, 0]), np.int64(boxes[k, 1])
+            kx2, ky2 = kx1 + boxes[k, 2], ky1 + boxes[k, 3]
+            inter = (max(0, min(ix2, kx2) - max(ix1, kx1)) *
+                     max(0, min(iy2, ky2) - max(iy1, ky1)))
+            union = area_i + (kx2 - kx1) * (ky2 - ky1) - inter
+            # Two empty boxes count as identical, as in OpenCV
+            iou = inter / union if union > 0 else 1.0
+            if iou > iou_thresh:
+                suppressed[k] = True
+
+    keep = keep[:kept]
+    return boxes[keep], scores[keep], class_ids[keep]
+
+
+postprocess = njit(cache=True)(_postprocess) if njit is not None else None
@@ -1,12 +1,52 @@
 #!/usr/bin/env python
+import argparse
+import atexit
 import cv2
+import numpy as np
 import sys
 import os
 import json
 import logging
+import logging.handlers
+import math
+import queue
 import subprocess
+import threading
 
 from YOLO_Pred import YOLO_Pred
+from video_io import open_capture, open_writer
+
+# Number of frames forwarded through the model at once (uploaded videos only)
+BATCH_SIZE = 4
+# Batches buffered between the reader, inference and writer threads
+QUEUE_SIZE = 8
+
+# Progress heartbeat, preformatted so reports skip building and serializing a dict
+PROGRESS_FMT = '{"progress": %d, "message": "Processing frame %d/%d"}\n'
+
+OUTPUT_DIR = 'videos'
+MODEL_PATH = 'models/best.onnx'
+DATA_YAML = 'models/data.yaml'
+
+# Serializes stdout writes from the reader, inference and writer threads
+_stdout_lock = threading.Lock()
+
+
+def write_line(line):
+    """
+    Write one newline-terminated line to the backend in a single call, so lines
+    from different threads never interleave.
+    """
+    with _stdout_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+def send_message(message):
+    """
+    Send a JSON message to the backend as a single line.
+    """
+    write_line(json.dumps(message) + '\n')
 
 
 def get_format_by_extension(file_path):
@@ -33,8 +73,8 @@ def convert_webm_to_mp4(input_path, output_path, preset='fast', crf=22):
 
     # Validate input file existence
     if not os.path.isfile(input_path):
-        print(json.dumps(
-            {'message': f"Error: Input file '{input_path}' not found."}))
+        send_message(
+            {'message': f"Error: Input file '{input_path}' not found."})
         return False
 
     # Ensure the output directory exists
@@ -42,11 +82,11 @@ def convert_webm_to_mp4(input_path, output_path, preset='fast', crf=22):
     if output_dir and not os.path.exists(output_dir):
         try:
             os.makedirs(output_dir, exist_ok=True)
-            print(json.dumps(
-                {'message': f"Created output directory '{output_dir}'."}))
+            send_message(
+                {'message': f"Created output directory '{output_dir}'."})
         except Exception as e:
-            print(json.dumps(
-                {'message': f"Error creating output directory '{output_dir}': {str(e)}"}))
+            send_message(
+                {'message': f"Error creating output directory '{output_dir}': {str(e)}"})
             return False
 
     # Construct the FFmpeg command
@@ -64,7 +104,7 @@ def convert_webm_to_mp4(input_path, output_path, preset='fast', crf=22):
         output_path                # Output file
     ]
 
-    print(json.dumps({'message': 'Converting WebM to MP4...'}))
+    send_message({'message': 'Converting WebM to MP4...'})
 
     try:
         # Execute the FFmpeg command
@@ -80,155 +120,340 @@ def convert_webm_to_mp4(input_path, output_path, preset='fast', crf=22):
         # print(process.stdout)
         # print(process.stderr)
 
-        print(json.dumps({'message': 'Conversion completed successfully.'}))
+        send_message({'message': 'Conversion completed successfully.'})
         return output_path
 
     except subprocess.CalledProcessError as e:
         # Handle errors in FFmpeg execution
-        print(json.dumps(
-            {'message': f"Error converting WebM to MP4: {e.stderr}"}))
-        print(e.stderr)
+        send_message(
+            {'message': f"Error converting WebM to MP4: {e.stderr}"})
         return None
 
     except FileNotFoundError:
         # FFmpeg is not installed or not found in PATH
-        print(json.dumps(
-            {'message': "Error: FFmpeg not found. Please install FFmpeg."}))
+        send_message(
+            {'message': "Error: FFmpeg not found. Please install FFmpeg."})
         return None
 
     except Exception as e:
         # Catch-all for any other exceptions
-        print(json.dumps(
-            {'message': f"An error occurred during conversion: {str(e)}"}))
+        send_message(
+            {'message': f"An error occurred during conversion: {str(e)}"})
         return None
 
 
-# Configure logging
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+def report_error(message):
+    """
+    Log an error and forward it to the backend as a final progress update.
+    """
+    logging.error(message)
+    send_message({'progress': 100, 'message': message})
 
-# Check if the input is a file or a stream
-input_source = sys.argv[1]
-is_live_stream = input_source.lower() == 'live'
 
+def load_model(soft_nms=False):
+    """
+    Initialize the YOLO model once so it can be shared by every job.
 
-ext = get_format_by_extension(input_source)
+    Args:
+        soft_nms (bool): Whether to use Gaussian soft-NMS instead of greedy NMS.
 
-if ext == 'webm':
-    # Convert WebM to MP4
-    mp4_output = convert_webm_to_mp4(
-        input_source, input_source.replace('.webm', '.mp4'))
-    if mp4_output:
-        input_source = mp4_output
-    else:
-        error_message = {
-            'progress': 100,
-            'message': 'Error converting WebM to MP4. Please check the input file.'
-        }
-        print(json.dumps(error_message))
-        sys.exit(1)
+    Returns:
+        YOLO_Pred: The loaded model, or None if initialization failed.
+    """
+    try:
+        return YOLO_Pred(MODEL_PATH, DATA_YAML, soft_nms=soft_nms)
+    except Exception as e:
+        report_error(f'Error initializing YOLO model: {str(e)}')
+        return None
 
-output_dir = 'videos'
-os.makedirs(output_dir, exist_ok=True)
 
-# Initialize YOLO model as a singleton
-model_path = 'models/best.onnx'
-data_yaml = 'models/data.yaml'
+def process(input_source, yolo_model, draw=True, soft_nms=False):
+    """
+    Run detection on a video file (or the live camera) and write the annotated
+    video to the output directory.
 
-try:
-    yolo_model = YOLO_Pred(model_path, data_yaml)
-except Exception as e:
-    error_message = {
-        'progress': 100,
-        'message': f'Error initializing YOLO model: {str(e)}'
-    }
-    logging.error(error_message['message'])
-    print(json.dumps(error_message))
-    sys.exit(1)
+    Args:
+        input_source (str): Path to the video file, or 'live' for the camera.
+        yolo_model (YOLO_Pred): Loaded model used for every frame.
+        draw (bool): Whether to draw detections on the output frames.
+        soft_nms (bool): Whether to use Gaussian soft-NMS instead of greedy NMS.
 
-# Video source: live stream or uploaded video
-cap = cv2.VideoCapture(0) if is_live_stream else cv2.VideoCapture(input_source)
+    Returns:
+        str: Path to the processed video, or None if processing failed.
+    """
+    # The model is shared by every job, so apply this job's NMS mode
+    yolo_model.soft_nms = soft_nms
 
-if not cap.isOpened():
-    error_message = {
-        'progress': 100,
-        'message': 'Error: Unable to open video source. Please check the input.'
-    }
-    logging.error(error_message['message'])
-    print(json.dumps(error_message))
-    sys.exit(1)
-
-# fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-fourcc = cv2.VideoWriter_fourcc(*'avc1')
-
-
-# Get video properties (use defaults for live streams)
-frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-fps = int(cap.get(cv2.CAP_PROP_FPS)) if not is_live_stream else 30
-frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)
-                  ) if not is_live_stream else -1
-
-# Output video path
-file_extension = os.path.splitext(input_source)[1]
-output_video_path = os.path.join(output_dir, os.path.basename(
-    input_source).replace(file_extension, f'-output{file_extension}'))
-out = cv2.VideoWriter(output_video_path, fourcc, fps,
+    is_live_stream = input_source.lower() == 'live'
+
+    ext = get_format_by_extension(input_source)
+
+    if ext == 'webm':
+        # Convert WebM to MP4
+        mp4_output = convert_webm_to_mp4(
+            input_source, input_source.replace('.webm', '.mp4'))
+        if mp4_output:
+            input_source = mp4_output
+        else:
+            report_error('Error converting WebM to MP4. Please check the input file.')
+            return None
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    # Video source: live stream or uploaded video
+    # Frames stay on the GPU through inference when the backend can take them
+    cap = open_capture(input_source, is_live_stream, yolo_model.gpu_input)
+
+    if not cap.isOpened():
+        report_error('Error: Unable to open video source. Please check the input.')
+        return None
+
+    # fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    fourcc = cv2.VideoWriter_fourcc(*'avc1')
+
+    # Get video properties (use defaults for live streams)
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = int(cap.get(cv2.CAP_PROP_FPS)) if not is_live_stream else 30
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)
+                      ) if not is_live_stream else -1
+    yolo_model.set_input_size(frame_height, frame_width)
+
+    # Output video path
+    file_extension = os.path.splitext(input_source)[1]
+    output_video_path = os.path.join(OUTPUT_DIR, os.path.basename(
+        input_source).replace(file_extension, f'-output{file_extension}'))
+    out = open_writer(output_video_path, fourcc, fps,
                       (frame_width, frame_height))
 
-frame_num = 0
-last_reported_progress = 0
+    if not out.isOpened():
+        report_error('Error: Unable to open the output video for writing.')
+        cap.release()
+        return None
+
+    # Batches of decoded frames; live streams hold only the freshest frame so
+    # latency stays at one inference even when the camera outpaces the model
+    raw_q = queue.Queue(maxsize=1 if is_live_stream else QUEUE_SIZE)
+    done_q = queue.Queue(maxsize=QUEUE_SIZE)  # Batches of frames with their detections
+    stop = threading.Event()
+
+    def put_latest(item):
+        """
+        Replace any frame the inference loop has not picked up yet.
+        """
+        try:
+            raw_q.get_nowait()
+        except queue.Empty:
+            pass
+        raw_q.put(item)
+
+    def read_frames():
+        """
+        Decode frames into batches for the inference loop, then send a sentinel.
+        """
+        batch = []
+
+        try:
+            while not stop.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    if not is_live_stream:  # For files, stop when frames are exhausted
+                        break
+                    continue  # For live streams, continue reading
+
+                if is_live_stream:
+                    put_latest([frame])  # Skip stale frames instead of queueing them
+                    continue
+
+                batch.append(frame)
+                if len(batch) >= BATCH_SIZE:
+                    raw_q.put(batch)
+                    batch = []
+
+            # Flush the trailing partial batch
+            if batch and not stop.is_set():
+                raw_q.put(batch)
+
+        except Exception as e:
+            report_error(f'An error occurred while reading frames: {str(e)}')
+            stop.set()
+        finally:
+            raw_q.put(None)
+
+    def write_frames():
+        """
+        Draw detections, write frames in order and report progress until the
+        sentinel.
+        """
+        def first_frame_at(progress):
+            """
+            First frame whose progress reaches `progress` percent.
+            """
+            n = -(-progress * frame_count // 100)
+            # Step past float rounding in the progress formula
+            while int((n / frame_count) * 100) < progress:
+                n += 1
+            while n > 1 and int(((n - 1) / frame_count) * 100) >= progress:
+                n -= 1
+            return n
+
+        frame_num = 0
+        # Report progress every 10 percentage points (only for uploaded videos);
+        # the next report frame is precomputed so each frame costs a single comparison
+        next_report_frame = first_frame_at(10) if not is_live_stream and frame_count > 0 else math.inf
+
+        while True:
+            item = done_q.get()
+            if item is None:
+                break
+            if stop.is_set():
+                continue  # Keep draining so the inference loop never blocks
+
+            try:
+                for frame, dets in zip(*item):
+                    if not isinstance(frame, np.ndarray):
+                        frame = frame.download()  # GpuMat kept on the GPU for inference
+                    if draw:
+                        yolo_model.draw(frame, dets)
+
+                    # Write the processed frame to the output video
+                    out.write(frame)
+
+                    frame_num += 1
+                    if frame_num >= next_report_frame:
+                        progress = int((frame_num / frame_count) * 100)
+                        write_line(PROGRESS_FMT % (progress, frame_num, frame_count))
+                        next_report_frame = first_frame_at(progress + 10)
+
+            except Exception as e:
+                report_error(f'An error occurred while writing frames: {str(e)}')
+                stop.set()
+
+    reader = threading.Thread(target=read_frames, daemon=True)
+    writer = threading.Thread(target=write_frames, daemon=True)
+    reader.start()
+    writer.start()
 
-try:
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            if not is_live_stream:  # For files, stop when frames are exhausted
+    try:
+        # Inference runs on this thread; OpenCV releases the GIL while it
+        # works, so decoding and encoding overlap with it
+        while True:
+            batch = raw_q.get()
+            if batch is None:
                 break
-            continue  # For live streams, continue reading
-
-        # Process the frame using YOLO model
-        processed_frame = yolo_model.predictions(frame)
-
-        if processed_frame is None:
-            error_message = {
-                'progress': 100,
-                'message': f'Error processing frame {frame_num}. Skipping.'
-            }
-            logging.warning(error_message['message'])
-            print(json.dumps(error_message))
-            continue
+            done_q.put((batch, yolo_model.detect_batch(batch)))
 
-        # Write the processed frame to the output video
-        out.write(processed_frame)
-
-        # Update progress (only for uploaded videos)
-        if not is_live_stream and frame_count > 0:
-            frame_num += 1
-            progress = int((frame_num / frame_count) * 100)
-            if progress - last_reported_progress >= 10:
-                progress_update = {
-                    'progress': progress,
-                    'message': f'Processing frame {frame_num}/{frame_count}'
-                }
-                print(json.dumps(progress_update))
-                last_reported_progress = progress
-
-except Exception as e:
-    error_message = {
-        'progress': 100,
-        'message': f'An error occurred during processing: {str(e)}'
+    except Exception as e:
+        report_error(f'An error occurred during processing: {str(e)}')
+        stop.set()
+    finally:
+        # Unblock the reader if inference stopped early, then let the writer finish
+        while reader.is_alive():
+            try:
+                raw_q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        done_q.put(None)
+        writer.join()
+        cap.release()
+        try:
+            out.release()
+        except Exception as e:
+            if not stop.is_set():  # Otherwise the original failure was already reported
+                report_error(f'An error occurred while saving the video: {str(e)}')
+            stop.set()
+
+    # Any thread that failed has reported its error; the output is incomplete
+    if stop.is_set():
+        return None
+
+    # Send the final output video path to the backend
+    output_video_info = {
+        'output_video': output_video_path  # This includes the correct -output suffix
     }
-    logging.error(error_message['message'])
-    print(json.dumps(error_message))
-finally:
-    cap.release()
-    out.release()
-
-# Final output path
-output_video_info = {
-    'output_video': output_video_path  # This includes the correct -output suffix
-}
-# Send the final output video path to the backend
-print(json.dumps(output_video_info))
-sys.exit(0)
+    send_message(output_video_info)
+    return output_video_path
+
+
+def serve(yolo_model, draw=True, soft_nms=False):
+    """
+    Process jobs read from stdin until it is closed, keeping the model warm
+    between videos.
+
+    Each job is a JSON line such as {"input": "/path/to/video.mp4"}, with an
+    optional "draw": false to skip annotating the output and "soft_nms": true
+    to use Gaussian soft-NMS. Progress
+    is reported exactly as for a single run, followed by a
+    {"status": "done"} or {"status": "failed"} line once the job finishes.
+    """
+    send_message({'status': 'ready'})
+
+    for line in iter(sys.stdin.readline, ''):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            job = json.loads(line)
+            input_source = job['input']
+        except (ValueError, KeyError, TypeError) as e:
+            report_error(f'Invalid job: {str(e)}')
+            send_message({'status': 'failed'})
+            continue
+
+        try:
+            output_video_path = process(input_source, yolo_model, job.get('draw', draw),
+                                        job.get('soft_nms', soft_nms))
+        except Exception as e:
+            # Keep the worker alive for the next job
+            report_error(f'An error occurred during processing: {str(e)}')
+            output_video_path = None
+        send_message({'status': 'done' if output_video_path else 'failed'})
+
+
+def configure_logging():
+    """
+    Route log records through a queue to a background listener, so the
+    reader, inference and writer threads never block on log I/O.
+    """
+    # Records are formatted on the calling thread; the listener only writes them
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s',
+                        handlers=[logging.handlers.QueueHandler(log_queue)])
+    listener.start()
+    atexit.register(listener.stop)  # Flush pending records on exit
+
+
+def main():
+    configure_logging()
+
+    parser = argparse.ArgumentParser(description='Run YOLO detection on a video.')
+    parser.add_argument('input', nargs='?', help="Path to the video file, or 'live' for the camera.")
+    parser.add_argument('--worker', action='store_true', help='Process JSON jobs from stdin.')
+    parser.add_argument('--no-draw', dest='draw', action='store_false',
+                        help='Skip drawing detections on the output frames.')
+    parser.add_argument('--soft-nms', action='store_true',
+                        help='Use Gaussian soft-NMS instead of greedy NMS.')
+    args = parser.parse_args()
+
+    if not args.worker and not args.input:
+        report_error('Usage: processVideo.py <video path | live | --worker> [--no-draw] [--soft-nms]')
+        sys.exit(1)
+
+    # Initialize YOLO model as a singleton
+    yolo_model = load_model(args.soft_nms)
+    if yolo_model is None:
+        sys.exit(1)
+
+    if args.worker:
+        serve(yolo_model, args.draw, args.soft_nms)
+        sys.exit(0)
+
+    # Check if the input is a file or a stream
+    sys.exit(0 if process(args.input, yolo_model, args.draw, args.soft_nms) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Export reduced-precision copies of the YOLO model next to the FP32 original.
+
+YOLO_Pred loads models/best.engine (on GPU), models/best.int8.onnx or
+models/best.fp16.onnx in preference to models/best.onnx when they exist.
+
+Usage:
+    python quantize_model.py fp16
+    python quantize_model.py int8 --calibration data_image/val
+    python quantize_model.py engine
+"""
+import argparse
+import glob
+import os
+import subprocess
+
+import cv2
+import numpy as np
+
+MODEL_PATH = 'models/best.onnx'
+INPUT_WH_YOLO = 640
+
+
+def export_fp16(model_path, output_path):
+    """
+    Convert weights and activations to FP16, keeping FP32 inputs and outputs so
+    callers can feed the same blob as for the original model.
+    """
+    import onnx
+    from onnxconverter_common import float16
+
+    model = onnx.load(model_path)
+    model_fp16 = float16.convert_float_to_float16(model, keep_io_types=True)
+    onnx.save(model_fp16, output_path)
+
+
+class ImageCalibrationReader:
+    """
+    Feeds letterboxed images from a directory to the static quantizer.
+    """
+
+    def __init__(self, input_name, image_dir, limit=100):
+        paths = sorted(glob.glob(os.path.join(image_dir, '*.jpg')) +
+                       glob.glob(os.path.join(image_dir, '*.png')))[:limit]
+        if not paths:
+            raise ValueError(f"No calibration images found in '{image_dir}'.")
+        self.input_name = input_name
+        self.paths = iter(paths)
+
+    def get_next(self):
+        path = next(self.paths, None)
+        if path is None:
+            return None
+
+        image = cv2.imread(path)
+        row, col, d = image.shape
+        max_rc = max(row, col)
+        image = cv2.copyMakeBorder(image, 0, max_rc - row, 0, max_rc - col, cv2.BORDER_CONSTANT, value=(0, 0, 0))
+        blob = cv2.dnn.blobFromImage(image, 1 / 255, (INPUT_WH_YOLO, INPUT_WH_YOLO), swapRB=True, crop=False)
+        return {self.input_name: blob.astype(np.float32)}
+
+
+def export_int8(model_path, output_path, calibration_dir):
+    """
+    Quantize weights and activations to INT8 in QDQ format, calibrating the
+    activation ranges on a directory of images. Weight-only (dynamic) INT8 is
+    not offered: it runs slower than the FP32 model on cv2.dnn.
+    """
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    input_name = onnx.load(model_path).graph.input[0].name
+    quantize_static(model_path, output_path, ImageCalibrationReader(input_name, calibration_dir),
+                    quant_format=QuantFormat.QDQ, activation_type=QuantType.QInt8,
+                    weight_type=QuantType.QInt8)
+
+
+def export_engine(model_path, output_path, workspace='4G'):
+    """
+    Build an FP16 TensorRT engine with trtexec. Engines are specific to the GPU
+    and TensorRT version they were built with, so build on the deployment host.
+    """
+    trtexec_command = [
+        'trtexec',
+        f'--onnx={model_path}',
+        f'--saveEngine={output_path}',
+        '--fp16',
+        f'--memPoolSize=workspace:{workspace}',
+    ]
+    subprocess.run(trtexec_command, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('precision', choices=['fp16', 'int8', 'engine'])
+    parser.add_argument('--model', default=MODEL_PATH, help='FP32 ONNX model to convert.')
+    parser.add_argument('--calibration', help='Directory of images for INT8 calibration (required for int8).')
+    args = parser.parse_args()
+
+    if args.precision == 'int8' and not args.calibration:
+        parser.error('int8 requires --calibration')
+
+    if args.precision == 'engine':
+        output_path = args.model.replace('.onnx', '.engine')
+        export_engine(args.model, output_path)
+        print(f'Saved {output_path}')
+        return
+
+    output_path = args.model.replace('.onnx', f'.{args.precision}.onnx')
+    if args.precision == 'fp16':
+        export_fp16(args.model, output_path)
+    else:
+        export_int8(args.model, output_path, args.calibration)
+    print(f'Saved {output_path}')
+
+
+if __name__ == '__main__':
+    main()
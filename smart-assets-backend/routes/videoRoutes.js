@@ -1,9 +1,9 @@
 const express = require("express");
 const multer = require("multer");
-const { PythonShell } = require("python-shell");
 const path = require("path");
 const fs = require("fs");
 const Video = require("../models/Video"); // Import the Video model
+const { processVideo } = require("../services/videoWorker");
 
 module.exports = (io) => {
   const router = express.Router();
@@ -55,22 +55,12 @@ module.exports = (io) => {
         message: "Processing started.",
       });
 
-      // Set up Python script options
-      const options = {
-        mode: "text",
-        pythonOptions: ["-u"],
-        scriptPath: path.join(__dirname, ".."),
-        args: [videoPath],
-      };
-
-      const pyshell = new PythonShell("processVideo.py", options);
       let detectedObjects = [];
 
-      // Handle messages from the Python script
-      pyshell.on("message", (message) => {
-        console.log("Python script message:", message);
-        try {
-          const update = JSON.parse(message);
+      // Queue the video on a warm Python worker and relay its messages
+      try {
+        await processVideo(videoPath, (update) => {
+          console.log("Python script message:", update);
 
           if (update.progress) {
             io.emit("processingUpdate", update);
@@ -78,76 +68,64 @@ module.exports = (io) => {
           if (update.detectedObjects) {
             detectedObjects = update.detectedObjects; // Collect detected objects
           }
-        } catch (err) {
-          console.error("Failed to parse progress update:", err);
-        }
-      });
-
-      // Handle errors from the Python script
-      pyshell.on("stderr", (stderr) => {
-        console.error("Python script error output:", stderr);
-      });
-
-      // End of Python script execution
-      pyshell.end(async (err) => {
-        if (err) {
-          console.error("Error during video processing:", err);
-          io.emit("processingUpdate", {
-            progress: 100,
-            message: "Processing failed.",
-          });
+        });
+      } catch (err) {
+        console.error("Error during video processing:", err);
+        io.emit("processingUpdate", {
+          progress: 100,
+          message: "Processing failed.",
+        });
+
+        // Update video status in the database
+        video.status = "processing_failed";
+        await video.save();
+
+        return res.status(500).send({ error: "Video processing failed!" });
+      }
 
-          // Update video status in the database
-          video.status = "processing_failed";
-          await video.save();
+      console.log("Python script finished successfully.");
 
-          return res.status(500).send({ error: "Video processing failed!" });
+      try {
+        // Ensure the videos folder exists
+        const videosDir = path.join(__dirname, "../videos");
+        if (!fs.existsSync(videosDir)) {
+          fs.mkdirSync(videosDir, { recursive: true });
         }
 
-        console.log("Python script finished successfully.");
-
-        try {
-          // Ensure the videos folder exists
-          const videosDir = path.join(__dirname, "../videos");
-          if (!fs.existsSync(videosDir)) {
-            fs.mkdirSync(videosDir, { recursive: true });
-          }
-
-          // Path to the processed video file
-          const processedVideoPath = path.join(videosDir, processedFilename);
-          const publicProcessedPath = `/videos/${processedFilename}`; // Relative URL for the processed video
-
-          // Update video document in MongoDB
-          video.status = "processed";
-          video.processedPath = publicProcessedPath;
-          video.processedAt = new Date();
-          video.detectedObjects = detectedObjects;
-          await video.save();
-
-          io.emit("processingUpdate", {
-            progress: 100,
-            message: "Processing completed!",
-          });
-
-          res.status(200).send({
-            message: "Video uploaded and processed successfully!",
-            videoId: video._id, // Return video ID
-            processedVideo: publicProcessedPath,
-            detectedObjects,
-          });
-        } catch (parseError) {
-          console.error("Failed to parse Python script output:", parseError);
-          io.emit("processingUpdate", {
-            progress: 100,
-            message: "Processing failed: Invalid output.",
-          });
-
-          video.status = "processing_failed";
-          await video.save();
-
-          res.status(500).send({ error: "Invalid output from Python script." });
-        }
-      });
+        // Path to the processed video file
+        const processedVideoPath = path.join(videosDir, processedFilename);
+        const publicProcessedPath = `/videos/${processedFilename}`; // Relative URL for the processed video
+
+        // Update video document in MongoDB
+        video.status = "processed";
+        video.processedPath = publicProcessedPath;
+        video.processedAt = new Date();
+        video.detectedObjects = detectedObjects;
+        await video.save();
+
+        io.emit("processingUpdate", {
+          progress: 100,
+          message: "Processing completed!",
+        });
+
+        res.status(200).send({
+          message: "Video uploaded and processed successfully!",
+          videoId: video._id, // Return video ID
+          processedVideo: publicProcessedPath,
+          detectedObjects,
+        });
+      } catch (parseError) {
+        console.error("Failed to parse Python script output:", parseError);
+        io.emit("processingUpdate", {
+          progress: 100,
+          message: "Processing failed: Invalid output.",
+        });
+
+        video.status = "processing_failed";
+        await video.save();
+
+        res.status(500).send({ error: "Invalid output from Python script." });
+      }
     } catch (error) {
       console.error("Error:", error);
       io.emit("processingUpdate", {
@@ -0,0 +1,149 @@
+const { PythonShell } = require("python-shell");
+const path = require("path");
+
+// Number of persistent Python workers, each holding one warm YOLO model
+const POOL_SIZE = parseInt(process.env.VIDEO_WORKERS, 10) || 1;
+const RESTART_DELAY_MS = 1000;
+// Consecutive failed starts before a worker is left stopped until the next job
+const MAX_START_FAILURES = 3;
+
+const jobs = []; // Pending jobs waiting for an idle worker
+const workers = [];
+
+// Start a processVideo.py worker that keeps the model loaded between jobs
+const spawnWorker = (worker = { failures: 0 }) => {
+  const options = {
+    mode: "text",
+    pythonOptions: ["-u"],
+    scriptPath: path.join(__dirname, ".."),
+    args: ["--worker"],
+  };
+
+  const shell = new PythonShell("processVideo.py", options);
+  worker.shell = shell;
+  worker.ready = false;
+  worker.stopped = false;
+  worker.job = null;
+
+  worker.shell.on("message", (message) => {
+    let update;
+    try {
+      update = JSON.parse(message);
+    } catch (err) {
+      console.error("Failed to parse worker message:", message);
+      return;
+    }
+
+    if (update.status === "ready") {
+      worker.ready = true;
+      worker.failures = 0;
+      return dispatch();
+    }
+
+    const job = worker.job;
+    if (!job) return;
+
+    if (update.status === "done" || update.status === "failed") {
+      worker.job = null;
+      if (update.status === "done") {
+        job.resolve();
+      } else {
+        job.reject(new Error("Video processing failed."));
+      }
+      return dispatch();
+    }
+
+    job.onMessage(update);
+  });
+
+  worker.shell.on("stderr", (stderr) => {
+    console.error("Python worker error output:", stderr);
+  });
+
+  // Fail the running job and restart the worker if the process exits
+  const onExit = () => {
+    if (worker.shell !== shell) return; // Already handled for this process
+    worker.shell = null;
+
+    if (worker.job) {
+      worker.job.reject(new Error("Python worker exited during processing."));
+      worker.job = null;
+    }
+
+    if (!worker.ready) {
+      // Died while loading the model; queued jobs would otherwise wait forever
+      worker.failures += 1;
+      if (!workers.some((w) => w.ready && w.shell)) {
+        rejectQueued(new Error("Python worker failed to start."));
+      }
+    }
+    worker.ready = false;
+
+    if (worker.failures >= MAX_START_FAILURES) {
+      console.error("Python worker failed to start repeatedly, stopping it.");
+      worker.stopped = true;
+      return;
+    }
+
+    // Back off exponentially while the worker keeps failing to start
+    const delay = RESTART_DELAY_MS * 2 ** worker.failures;
+    console.error(`Python worker exited, restarting in ${delay} ms.`);
+    setTimeout(() => spawnWorker(worker), delay);
+  };
+
+  worker.shell.on("close", onExit);
+
+  // Spawn failures (e.g. a missing interpreter) emit "error" without "close"
+  worker.shell.on("error", (err) => {
+    console.error("Python worker error:", err);
+    onExit();
+  });
+
+  return worker;
+};
+
+// Hand queued jobs to idle workers, one job per worker at a time
+const dispatch = () => {
+  for (const worker of workers) {
+    if (!jobs.length) return;
+    if (worker.ready && !worker.job) {
+      worker.job = jobs.shift();
+      worker.shell.send(JSON.stringify({ input: worker.job.input }));
+    }
+  }
+};
+
+// Fail every job still waiting for a worker
+const rejectQueued = (err) => {
+  jobs.splice(0).forEach((job) => job.reject(err));
+};
+
+/**
+ * Queue a video for processing on the warm worker pool.
+ *
+ * @param {string} input - Path to the uploaded video.
+ * @param {function} onMessage - Called with every JSON update from the worker.
+ * @returns {Promise<void>} Resolves once the video has been processed.
+ */
+const processVideo = (input, onMessage) => {
+  if (!workers.length) {
+    for (let i = 0; i < POOL_SIZE; i++) {
+      workers.push(spawnWorker());
+    }
+  }
+
+  // Give workers that gave up after failed starts another chance
+  for (const worker of workers) {
+    if (worker.stopped) {
+      worker.failures = 0;
+      spawnWorker(worker);
+    }
+  }
+
+  return new Promise((resolve, reject) => {
+    jobs.push({ input, onMessage, resolve, reject });
+    dispatch();
+  });
+};
+
+module.exports = { processVideo };
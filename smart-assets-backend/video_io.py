@@ -0,0 +1,262 @@
+import functools
+import logging
+import subprocess
+
+import cv2
+
+from YOLO_Pred import cuda_available
+
+# cv2.rotate codes for the counterclockwise display rotations PyAV reports
+_ROTATE_CODES = {
+    90: cv2.ROTATE_90_COUNTERCLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_CLOCKWISE,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def cudacodec_available():
+    """
+    Check whether OpenCV can decode video on the GPU (NVDEC).
+    """
+    return hasattr(cv2, 'cudacodec') and cuda_available()
+
+
+@functools.lru_cache(maxsize=None)
+def nvenc_available():
+    """
+    Check whether FFmpeg is installed with the NVENC H.264 encoder.
+    """
+    try:
+        process = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        return 'h264_nvenc' in process.stdout and cuda_available()
+    except FileNotFoundError:
+        return False
+
+
+class GpuVideoCapture:
+    def __init__(self, input_source, keep_on_gpu=False):
+        """
+        Decodes a video file with cv2.cudacodec, exposing the subset of the
+        cv2.VideoCapture interface used by processVideo.py.
+
+        Args:
+            input_source (str): Path to the video file.
+            keep_on_gpu (bool): Whether read() returns GpuMats instead of
+                downloading each frame.
+
+        Raises:
+            ValueError: If the video has rotation metadata.
+        """
+        # cudacodec does not report frame counts, so read properties from a CPU probe
+        probe = cv2.VideoCapture(input_source)
+        self._props = {prop: probe.get(prop) for prop in (
+            cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS, cv2.CAP_PROP_FRAME_COUNT)}
+        rotation = probe.get(cv2.CAP_PROP_ORIENTATION_META)
+        probe.release()
+
+        # The probe reports the upright size, but cudacodec returns unrotated frames
+        if rotation:
+            raise ValueError(f"GPU decoding does not apply the video's {rotation:.0f} degree rotation")
+
+        self.reader = cv2.cudacodec.createVideoReader(input_source)
+        self.reader.set(cv2.cudacodec.ColorFormat_BGR)
+        self.keep_on_gpu = keep_on_gpu
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def get(self, prop):
+        return self._props.get(prop, 0)
+
+    def read(self):
+        ret, gpu_frame = self.reader.nextFrame()
+        if not ret:
+            return False, None
+        if self.keep_on_gpu:
+            return True, gpu_frame
+        return True, gpu_frame.download()
+
+    def release(self):
+        self._opened = False
+        self.reader = None
+
+
+class PyAVVideoCapture:
+    def __init__(self, input_source):
+        """
+        Decodes a video file with PyAV (FFmpeg's libav bindings), exposing the
+        subset of the cv2.VideoCapture interface used by processVideo.py.
+
+        Frames are converted by swscale straight from the decoder's YUV planes
+        into a BGR ndarray, and decoding is multi-threaded. Like
+        cv2.VideoCapture, frames are rotated upright according to the stream's
+        display matrix.
+
+        Args:
+            input_source (str): Path to the video file.
+
+        Raises:
+            ImportError: If PyAV is not installed or too old to report rotation.
+        """
+        import av
+
+        if not hasattr(av.VideoFrame, 'rotation'):
+            raise ImportError('PyAV does not expose frame rotation')
+
+        self.container = av.open(input_source)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = 'AUTO'
+        self._frames = self.container.decode(self.stream)
+
+        # Rotation is only reported on decoded frames, so hold the first one back
+        self._first_frame = next(self._frames, None)
+        rotation = self._first_frame.rotation % 360 if self._first_frame is not None else 0
+        self._rotate = _ROTATE_CODES.get(rotation)
+
+        width, height = self.stream.codec_context.width, self.stream.codec_context.height
+        if rotation in (90, 270):
+            width, height = height, width
+
+        fps = float(self.stream.average_rate or 0)
+        frame_count = self.stream.frames
+        if not frame_count and self.stream.duration and fps:
+            # Some containers do not store a frame count; estimate it from the duration
+            frame_count = int(self.stream.duration * self.stream.time_base * fps)
+        self._props = {
+            cv2.CAP_PROP_FRAME_WIDTH: width,
+            cv2.CAP_PROP_FRAME_HEIGHT: height,
+            cv2.CAP_PROP_FPS: fps,
+            cv2.CAP_PROP_FRAME_COUNT: frame_count,
+        }
+
+    def isOpened(self):
+        return self.container is not None
+
+    def get(self, prop):
+        return self._props.get(prop, 0)
+
+    def read(self):
+        if self._first_frame is not None:
+            frame, self._first_frame = self._first_frame, None
+        else:
+            frame = next(self._frames, None)
+        if frame is None:
+            return False, None
+
+        image = frame.to_ndarray(format='bgr24')
+        if self._rotate is not None:
+            image = cv2.rotate(image, self._rotate)
+        return True, image
+
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+
+
+class FFmpegVideoWriter:
+    def __init__(self, output_path, fps, frame_size, codec='h264_nvenc', preset='p3'):
+        """
+        Encodes BGR frames by piping them to FFmpeg, exposing the subset of the
+        cv2.VideoWriter interface used by processVideo.py.
+
+        Args:
+            output_path (str): Path where the encoded video will be saved.
+            fps (int): Output frame rate.
+            frame_size (tuple): (width, height) of the frames.
+            codec (str): FFmpeg video encoder.
+            preset (str): Encoder preset.
+        """
+        width, height = frame_size
+        ffmpeg_command = [
+            'ffmpeg',
+            '-y',                      # Overwrite output file without asking
+            '-f', 'rawvideo',          # Raw frames on stdin
+            '-pix_fmt', 'bgr24',
+            '-s', f'{width}x{height}',
+            '-r', str(fps),
+            '-i', '-',
+            '-c:v', codec,             # Video codec
+            '-preset', preset,         # Preset for encoding speed and compression
+            '-pix_fmt', 'yuv420p',     # Widely playable output format
+            output_path                # Output file
+        ]
+        self.process = subprocess.Popen(ffmpeg_command, stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def isOpened(self):
+        return self.process.poll() is None
+
+    def write(self, frame):
+        # Frames are contiguous, so FFmpeg reads the ndarray buffer without a copy
+        try:
+            self.process.stdin.write(frame.data)
+        except BrokenPipeError:
+            raise RuntimeError(f'FFmpeg exited with status {self.process.wait()} while encoding')
+
+    def release(self):
+        """
+        Finish encoding and wait for FFmpeg to exit.
+
+        Raises:
+            RuntimeError: If FFmpeg failed, e.g. no NVENC session was available.
+        """
+        if self.process.stdin and not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass  # FFmpeg already exited; its status is checked below
+        returncode = self.process.wait()
+        if returncode != 0:
+            raise RuntimeError(f'FFmpeg exited with status {returncode}')
+
+
+def open_capture(input_source, is_live_stream, keep_on_gpu=False):
+    """
+    Open a video source, decoding on the GPU when possible, then with PyAV,
+    then with cv2.VideoCapture.
+
+    Args:
+        input_source (str): Path to the video file.
+        is_live_stream (bool): Whether to open the camera instead.
+        keep_on_gpu (bool): Whether GPU-decoded frames stay on the GPU as GpuMats.
+
+    Returns:
+        cv2.VideoCapture, GpuVideoCapture or PyAVVideoCapture: The opened capture.
+    """
+    if is_live_stream:
+        return cv2.VideoCapture(0)
+
+    if cudacodec_available():
+        try:
+            cap = GpuVideoCapture(input_source, keep_on_gpu)
+            logging.info("Decoding video on the GPU.")
+            return cap
+        except Exception as e:
+            logging.warning(f"GPU decoding unavailable, falling back to CPU: {str(e)}")
+
+    try:
+        return PyAVVideoCapture(input_source)
+    except ImportError:
+        pass
+    except Exception as e:
+        logging.warning(f"PyAV could not open {input_source}, falling back to OpenCV: {str(e)}")
+
+    return cv2.VideoCapture(input_source)
+
+
+def open_writer(output_path, fourcc, fps, frame_size):
+    """
+    Open a video writer, encoding with NVENC when possible.
+
+    Returns:
+        cv2.VideoWriter or FFmpegVideoWriter: The opened writer.
+    """
+    if nvenc_available():
+        logging.info("Encoding video with NVENC.")
+        return FFmpegVideoWriter(output_path, fps, frame_size)
+
+    return cv2.VideoWriter(output_path, fourcc, fps, frame_size)